@@ -6,44 +6,72 @@ This script builds a knowledge graph of the projects directory using the memory
 It creates entities for projects, files, and components, and establishes relationships between them.
 """
 
+import codecs
 import os
 import json
 import sys
 import time
 from typing import List, Dict, Any, Optional
 
+# orjson is much faster on large files; fall back to json without it
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Configuration
 PROJECTS_DIR = '/home/thein/projects'
-IGNORE_DIRS = [
+IGNORE_DIRS = frozenset([
     'node_modules', '.git', '.vscode', 'out', 'dist', 'build', 'coverage', '.cache'
-]
+])
 KEY_FILES = [
     'package.json', 'README.md', '.augment-guidelines', 'tsconfig.json',
     'docker-compose.yml', 'Dockerfile', 'devcontainer.json'
 ]
 MAX_CONTENT_SIZE = 5000  # Maximum size of file content to include
-MAX_BATCH_SIZE = 5  # Maximum number of entities/relations to create in a single batch
 
-def read_file_safe(file_path: str, max_size: int = MAX_CONTENT_SIZE) -> str:
+def read_file_safe(entry: os.DirEntry, max_size: int = MAX_CONTENT_SIZE) -> str:
     """Read file content safely with size limit."""
     try:
-        file_size = os.path.getsize(file_path)
-        if file_size > max_size:
-            return f"File too large ({file_size} bytes)"
-        
-        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
-            content = f.read()
-            if len(content) > max_size:
-                return content[:max_size] + "... (truncated)"
-            return content
+        # Stop reading at the cap; one byte past it means the file is truncated
+        with open(entry.path, 'rb') as f:
+            data = f.read(max_size + 1)
+        if len(data) > max_size:
+            # Leave out a character split by the cap rather than decoding it as U+FFFD
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+            return decoder.decode(data[:max_size]) + "... (truncated)"
+        return data.decode('utf-8', errors='replace')
     except Exception as e:
         return f"Error reading file: {str(e)}"
 
+def read_package_json(entry: os.DirEntry) -> Dict[str, Any]:
+    """Parse package.json straight from its bytes, without a size limit."""
+    with open(entry.path, 'rb') as f:
+        data = f.read()
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def scan_entries(dir_path: str) -> Dict[str, os.DirEntry]:
+    """List a directory's entries by name, treating an unreadable directory as empty."""
+    try:
+        with os.scandir(dir_path) as it:
+            return {entry.name: entry for entry in it}
+    except OSError as e:
+        print(f"Error reading directory {dir_path}: {str(e)}")
+        return {}
+
 def process_project(project_path: str) -> None:
     """Process a project and add it to the knowledge graph."""
     project_name = os.path.basename(project_path)
     print(f"Processing project: {project_name}")
     
+    # Scan the project directory once and look up candidate files by name
+    entries = scan_entries(project_path)
+    
+    entities = []
+    relations = []
+    
     # Create project entity
     project_entity = {
         "name": project_name,
@@ -52,11 +80,10 @@ def process_project(project_path: str) -> None:
     }
     
     # Add package.json info if available
-    package_json_path = os.path.join(project_path, 'package.json')
-    if os.path.exists(package_json_path):
+    package_json_entry = entries.get('package.json')
+    if package_json_entry and package_json_entry.is_file(follow_symlinks=False):
         try:
-            package_content = read_file_safe(package_json_path)
-            package_json = json.loads(package_content)
+            package_json = read_package_json(package_json_entry)
             if 'name' in package_json:
                 project_entity["observations"].append(f"Name: {package_json['name']}")
             if 'description' in package_json:
@@ -67,94 +94,78 @@ def process_project(project_path: str) -> None:
             print(f"Error parsing package.json for {project_name}: {str(e)}")
     
     # Add README.md content if available
-    readme_path = os.path.join(project_path, 'README.md')
-    if os.path.exists(readme_path):
-        readme_content = read_file_safe(readme_path)
+    readme_entry = entries.get('README.md')
+    if readme_entry and readme_entry.is_file(follow_symlinks=False):
+        readme_content = read_file_safe(readme_entry)
         project_entity["observations"].append(f"README: {readme_content}")
     
-    # Create the project entity
-    create_entities_memory({"entities": [project_entity]})
-    print(f"Created project entity: {project_name}")
+    entities.append(project_entity)
     
     # Process key files
-    file_entities = []
-    file_relations = []
-    
     for file_name in KEY_FILES:
-        file_path = os.path.join(project_path, file_name)
-        if os.path.exists(file_path) and os.path.isfile(file_path):
+        entry = entries.get(file_name)
+        if entry and entry.is_file(follow_symlinks=False):
+            file_path = entry.path
             entity_name = f"{project_name}-{file_name}"
-            file_content = read_file_safe(file_path)
+            file_content = read_file_safe(entry)
             
-            file_entities.append({
+            entities.append({
                 "name": entity_name,
                 "entityType": "File",
                 "observations": [f"Path: {file_path}", f"Content: {file_content}"]
             })
             
-            file_relations.append({
+            relations.append({
                 "from": project_name,
                 "to": entity_name,
                 "relationType": "contains"
             })
     
-    # Create file entities and relations in batches
-    if file_entities:
-        for i in range(0, len(file_entities), MAX_BATCH_SIZE):
-            batch = file_entities[i:i+MAX_BATCH_SIZE]
-            create_entities_memory({"entities": batch})
-            print(f"Created {len(batch)} file entities (batch {i // MAX_BATCH_SIZE + 1})")
-    
-    if file_relations:
-        for i in range(0, len(file_relations), MAX_BATCH_SIZE):
-            batch = file_relations[i:i+MAX_BATCH_SIZE]
-            create_relations_memory({"relations": batch})
-            print(f"Created {len(batch)} file relations (batch {i // MAX_BATCH_SIZE + 1})")
-    
     # Process .devcontainer directory if it exists
-    devcontainer_dir = os.path.join(project_path, '.devcontainer')
-    if os.path.exists(devcontainer_dir) and os.path.isdir(devcontainer_dir):
-        devcontainer_entity = {
-            "name": f"{project_name}-devcontainer",
+    devcontainer_entry = entries.get('.devcontainer')
+    if devcontainer_entry and devcontainer_entry.is_dir(follow_symlinks=False):
+        devcontainer_entries = scan_entries(devcontainer_entry.path)
+        devcontainer_name = f"{project_name}-devcontainer"
+        
+        entities.append({
+            "name": devcontainer_name,
             "entityType": "Component",
             "observations": ["DevContainer configuration for the project"]
-        }
+        })
         
-        create_entities_memory({"entities": [devcontainer_entity]})
-        create_relations_memory({"relations": [{
+        relations.append({
             "from": project_name,
-            "to": f"{project_name}-devcontainer",
+            "to": devcontainer_name,
             "relationType": "has"
-        }]})
-        
-        print(f"Created devcontainer entity for {project_name}")
+        })
         
         # Process important devcontainer files
-        devcontainer_files = []
-        devcontainer_relations = []
-        
         for file_name in ['devcontainer.json', 'docker-compose.yml', 'Dockerfile']:
-            file_path = os.path.join(devcontainer_dir, file_name)
-            if os.path.exists(file_path) and os.path.isfile(file_path):
-                entity_name = f"{project_name}-devcontainer-{file_name}"
-                file_content = read_file_safe(file_path)
+            entry = devcontainer_entries.get(file_name)
+            if entry and entry.is_file(follow_symlinks=False):
+                file_path = entry.path
+                entity_name = f"{devcontainer_name}-{file_name}"
+                file_content = read_file_safe(entry)
                 
-                devcontainer_files.append({
+                entities.append({
                     "name": entity_name,
                     "entityType": "ConfigFile",
                     "observations": [f"Path: {file_path}", f"Content: {file_content}"]
                 })
                 
-                devcontainer_relations.append({
-                    "from": f"{project_name}-devcontainer",
+                relations.append({
+                    "from": devcontainer_name,
                     "to": entity_name,
                     "relationType": "contains"
                 })
-        
-        if devcontainer_files:
-            create_entities_memory({"entities": devcontainer_files})
-            create_relations_memory({"relations": devcontainer_relations})
-            print(f"Created {len(devcontainer_files)} devcontainer file entities")
+    
+    # Create all entities, then all relations, in one call each
+    create_entities_memory({"entities": entities})
+    print(f"Created {len(entities)} entities for {project_name}")
+    
+    if relations:
+        create_relations_memory({"relations": relations})
+        print(f"Created {len(relations)} relations for {project_name}")
 
 def build_knowledge_graph() -> None:
     """Main function to build the knowledge graph."""
@@ -162,16 +173,17 @@ def build_knowledge_graph() -> None:
     
     try:
         # Get list of projects
-        projects = [
-            os.path.join(PROJECTS_DIR, item) for item in os.listdir(PROJECTS_DIR)
-            if os.path.isdir(os.path.join(PROJECTS_DIR, item)) and item not in IGNORE_DIRS
-        ]
+        with os.scandir(PROJECTS_DIR) as it:
+            projects = [
+                entry for entry in it
+                if entry.is_dir(follow_symlinks=False) and entry.name not in IGNORE_DIRS
+            ]
         
-        print(f"Found {len(projects)} projects: {', '.join(os.path.basename(p) for p in projects)}")
+        print(f"Found {len(projects)} projects: {', '.join(project.name for project in projects)}")
         
         # Process each project
         for project in projects:
-            process_project(project)
+            process_project(project.path)
         
         print("Knowledge graph built successfully!")
     except Exception as e:
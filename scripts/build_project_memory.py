@@ -6,37 +6,161 @@ This script builds a knowledge graph of the projects folder using the Neo4j memo
 It indexes files, directories, and their relationships to create a vector RAG system.
 """
 
+import codecs
 import os
+import re
 import sys
 import json
 import subprocess
-import argparse
-from typing import List, Dict, Any, Optional, Tuple
+import fnmatch
+import functools
+import shutil
+import threading
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+
+from mcp_transport import MCPTransport
 
 # Constants
 PROJECTS_DIR = "/home/thein/projects"
 MEMORY_CONTAINER_NAME = "mcp/memory"
+CONTAINER_ID_ENV_VAR = "MCP_MEMORY_CONTAINER_ID"  # Overrides the container lookup
+QUERY_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "adamize")  # Results cached by query_project_memory.py
+DOCKER_SOCKET = "/var/run/docker.sock"
+DOCKER_API_TIMEOUT = 2  # Seconds to wait for the Docker API before falling back to docker ps
 MAX_OBSERVATION_LENGTH = 1000  # Maximum length of an observation in characters
-EXCLUDED_DIRS = [".git", "node_modules", ".vscode-test", "out", "dist", "__pycache__"]
-EXCLUDED_FILES = [".DS_Store", "*.pyc", "*.pyo", "*.pyd", "*.so", "*.dll", "*.class"]
-INCLUDED_EXTENSIONS = [
+MAX_WORKERS = 8  # Maximum number of projects to index concurrently
+MIN_BATCH_SIZE = 100  # Entities/relations to gather across directories before sending a call
+# Tools that do not change the graph; these can be in flight together
+READ_ONLY_TOOLS = frozenset(["read_graph", "search_nodes", "open_nodes"])
+EXCLUDED_DIRS = frozenset([".git", "node_modules", ".vscode-test", "out", "dist", "__pycache__"])
+EXCLUDED_FILES = frozenset([".DS_Store", "*.pyc", "*.pyo", "*.pyd", "*.so", "*.dll", "*.class"])
+INCLUDED_EXTENSIONS = frozenset([
     ".py", ".js", ".ts", ".tsx", ".jsx", ".java", ".c", ".cpp", ".h", ".hpp",
     ".cs", ".go", ".rb", ".php", ".rs", ".swift", ".kt", ".md", ".json", ".yaml",
     ".yml", ".xml", ".html", ".css", ".scss", ".sass", ".sh", ".bash", ".txt"
-]
+])
+
+# Single compiled pattern matching any of the EXCLUDED_FILES names and globs
+EXCLUDED_FILES_PATTERN = re.compile("|".join(fnmatch.translate(pattern) for pattern in EXCLUDED_FILES))
 
 class MCPClient:
-    """Client for interacting with MCP servers."""
+    """Client for interacting with MCP servers.
+
+    Tool calls are sent over a persistent MCPTransport. A single client can be
+    shared by any number of threads, each with any number of read-only calls
+    in flight.
 
-    def __init__(self, container_id: str):
+    The memory server loads, modifies and saves its whole graph on every
+    change, so calls that change the graph are kept to one in flight across
+    all threads; otherwise two overlapping calls could each save over the
+    other's changes. Sending a change waits for the previous one to finish,
+    but not for its own response.
+    """
+
+    def __init__(self, container_id: str, verbose: bool = False):
         """Initialize the MCP client.
 
         Args:
             container_id: The ID or name of the MCP container
+            verbose: Whether to show the MCP server's stderr output
         """
         self.container_id = container_id
-        self.request_id = 0
+        self.transport = MCPTransport(container_id, verbose)
+        self.pending = {}  # Future -> tool name, for calls not yet awaited
+        self.change_slot = threading.Semaphore(1)  # Held while a graph-changing call is in flight
+
+    def __enter__(self) -> "MCPClient":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the connection to the MCP server and wait for it to exit."""
+        self.transport.close()
+
+    def submit_many(self, calls: List[Tuple[str, Dict[str, Any]]]) -> List[Future]:
+        """Send tool calls to the MCP server without waiting for the responses.
+
+        Read-only requests are written to the server together. Requests that
+        change the graph are sent one at a time, each once the previous change
+        has been answered.
+
+        Args:
+            calls: (tool name, parameters) pairs for the tools to call
+
+        Returns:
+            Futures for the responses, to be passed to wait()
+        """
+        # In JSON-RPC 2.0, the method is the tool name directly. Consecutive
+        # read-only calls go out together; each change waits for the last one
+        futures = []
+        reads = []
+        for call in calls:
+            if call[0] in READ_ONLY_TOOLS:
+                reads.append(call)
+                continue
+
+            futures.extend(self.transport.send_many(reads))
+            reads = []
+            futures.append(self._send_change(*call))
+        futures.extend(self.transport.send_many(reads))
+
+        for (tool_name, _), future in zip(calls, futures):
+            self.pending[future] = tool_name
+
+        return futures
+
+    def _send_change(self, tool_name: str, params: Dict[str, Any]) -> Future:
+        """Send a graph-changing tool call once no other change is in flight.
+
+        Args:
+            tool_name: The name of the tool to call
+            params: The parameters to pass to the tool
+
+        Returns:
+            A Future for the response
+        """
+        self.change_slot.acquire()
+        try:
+            future = self.transport.send(tool_name, params)
+        except BaseException:
+            self.change_slot.release()
+            raise
+
+        # Released on the reader thread as soon as the response (or failure) arrives
+        future.add_done_callback(lambda _: self.change_slot.release())
+        return future
+
+    def submit(self, tool_name: str, params: Dict[str, Any]) -> Future:
+        """Send a tool call to the MCP server without waiting for the response.
+
+        Args:
+            tool_name: The name of the tool to call
+            params: The parameters to pass to the tool
+
+        Returns:
+            A Future for the response, to be passed to wait()
+        """
+        return self.submit_many([(tool_name, params)])[0]
+
+    def wait(self, future: Future) -> Dict[str, Any]:
+        """Wait for the response to a previously submitted tool call.
+
+        Args:
+            future: The Future returned by submit()
+
+        Returns:
+            The result of the tool call
+        """
+        tool_name = self.pending.pop(future)
+        response = future.result()
+        if "result" not in response:
+            raise Exception(f"Error calling tool {tool_name}: {response.get('error', response)}")
+
+        return response["result"]
 
     def call_tool(self, tool_name: str, params: Dict[str, Any]) -> Dict[str, Any]:
         """Call a tool on the MCP server.
@@ -48,91 +172,139 @@ class MCPClient:
         Returns:
             The result of the tool call
         """
-        # In JSON-RPC 2.0, the method is the tool name directly
-        request = {
-            "jsonrpc": "2.0",
-            "id": self.request_id,
-            "method": tool_name,
-            "params": params
-        }
-        self.request_id += 1
-
-        # Convert request to JSON
-        request_json = json.dumps(request)
-
-        # Call the tool using docker exec
-        cmd = [
-            "docker", "exec", "-i", self.container_id,
-            "sh", "-c", f"echo '{request_json}' | node dist/index.js"
-        ]
+        return self.wait(self.submit(tool_name, params))
 
-        try:
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                check=True
-            )
-
-            # Parse the response
-            response_lines = result.stdout.strip().split("\n")
-            for line in response_lines:
-                if line.startswith("{"):
-                    try:
-                        response = json.loads(line)
-                        if "result" in response:
-                            return response["result"]
-                    except json.JSONDecodeError:
-                        continue
-
-            raise Exception(f"Failed to parse response: {result.stdout}")
-        except subprocess.CalledProcessError as e:
-            print(f"Error calling tool {tool_name}: {e}")
-            print(f"Stdout: {e.stdout}")
-            print(f"Stderr: {e.stderr}")
-            raise
+    def call_tools_pipelined(self, calls: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Call several tools on the MCP server, sending requests without waiting.
+
+        Read-only calls are all sent up front. Calls that change the graph are
+        still sent one at a time, as described for the class.
+
+        Args:
+            calls: (tool name, parameters) pairs for the tools to call
+
+        Returns:
+            The results of the tool calls, in the same order as the calls
+        """
+        return [self.wait(future) for future in self.submit_many(calls)]
+
+def find_container_with_docker_api(image: str, socket_path: str = DOCKER_SOCKET) -> Optional[str]:
+    """Look up a running container by image through the Docker Engine API.
+
+    This is the same query as docker ps --filter ancestor=<image>, without
+    starting the docker CLI.
 
+    Args:
+        image: The image the container was started from
+        socket_path: The path of the Docker daemon's unix socket
+
+    Returns:
+        The short ID of the first matching container, or None if there is none
+
+    Raises:
+        OSError: If the Docker API cannot be reached over the socket
+    """
+    # Only needed for this lookup, and http.client is slow enough to import
+    # that it is not worth loading when the container ID is already known
+    import http.client
+    import socket
+    import urllib.parse
+
+    class UnixHTTPConnection(http.client.HTTPConnection):
+        """HTTP connection over a unix domain socket."""
+
+        def __init__(self, path: str):
+            super().__init__("localhost", timeout=DOCKER_API_TIMEOUT)
+            self.socket_path = path
+
+        def connect(self) -> None:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(self.timeout)
+            self.sock.connect(self.socket_path)
+
+    query = urllib.parse.urlencode({"filters": json.dumps({"ancestor": [image]})})
+    connection = UnixHTTPConnection(socket_path)
+    try:
+        connection.request("GET", f"/containers/json?{query}")
+        response = connection.getresponse()
+        body = response.read()
+    except http.client.HTTPException as e:
+        raise OSError(f"Docker API request failed: {e}") from e
+    finally:
+        connection.close()
+
+    if response.status != 200:
+        raise OSError(f"Docker API returned HTTP {response.status}: {body[:200]!r}")
+
+    containers = json.loads(body)
+    if not containers:
+        return None
+    return containers[0]["Id"][:12]
+
+@functools.lru_cache(maxsize=1)
 def get_memory_container_id() -> str:
     """Get the ID of the memory container.
 
+    The MCP_MEMORY_CONTAINER_ID environment variable is used when set.
+    Otherwise the container is looked up through the local Docker API socket,
+    and with docker ps when the socket is not accessible or finds nothing.
+    docker ps alone is used when DOCKER_HOST or DOCKER_CONTEXT points the CLI
+    at another daemon. Either way the result is cached for the rest of the
+    process.
+
     Returns:
         The ID of the memory container
     """
-    cmd = ["docker", "ps", "--filter", f"ancestor={MEMORY_CONTAINER_NAME}", "--format", "{{.ID}}"]
-    result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-    container_id = result.stdout.strip()
+    container_id = os.environ.get(CONTAINER_ID_ENV_VAR)
+    if container_id:
+        return container_id
+
+    container_id = None
+    if not os.environ.get("DOCKER_HOST") and not os.environ.get("DOCKER_CONTEXT"):
+        try:
+            container_id = find_container_with_docker_api(MEMORY_CONTAINER_NAME)
+        except (OSError, ValueError):
+            pass
+
+    # The CLI also follows the current docker context, which may not be the
+    # daemon behind the default socket
+    if not container_id:
+        cmd = ["docker", "ps", "--filter", f"ancestor={MEMORY_CONTAINER_NAME}", "--format", "{{.ID}}"]
+        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        container_id = result.stdout.split("\n", 1)[0].strip()
 
     if not container_id:
         raise Exception(f"Memory container {MEMORY_CONTAINER_NAME} not found")
 
     return container_id
 
-def should_include_file(file_path: str) -> bool:
+def clear_query_cache() -> None:
+    """Remove the results cached by query_project_memory.py, which go stale once the graph changes."""
+    shutil.rmtree(QUERY_CACHE_DIR, ignore_errors=True)
+
+def should_include_file(entry: os.DirEntry) -> bool:
     """Check if a file should be included in the knowledge graph.
 
+    Files inside EXCLUDED_DIRS are never seen here, because walk_directory()
+    prunes those directories before descending into them.
+
     Args:
-        file_path: The path to the file
+        entry: The directory entry for the file
 
     Returns:
         True if the file should be included, False otherwise
     """
-    # Check if the file is in an excluded directory
-    for excluded_dir in EXCLUDED_DIRS:
-        if f"/{excluded_dir}/" in file_path or file_path.endswith(f"/{excluded_dir}"):
-            return False
+    file_name = entry.name
+
+    # Check if the file has an included extension (a leading dot, as in
+    # ".bashrc", does not start one)
+    dot = file_name.rfind(".")
+    ext = file_name[dot:].lower() if dot > 0 else ""
+    if ext not in INCLUDED_EXTENSIONS:
+        return False
 
     # Check if the file is excluded
-    file_name = os.path.basename(file_path)
-    for excluded_file in EXCLUDED_FILES:
-        if excluded_file.startswith("*"):
-            if file_name.endswith(excluded_file[1:]):
-                return False
-        elif file_name == excluded_file:
-            return False
-
-    # Check if the file has an included extension
-    _, ext = os.path.splitext(file_path)
-    if ext.lower() not in INCLUDED_EXTENSIONS:
+    if EXCLUDED_FILES_PATTERN.match(file_name):
         return False
 
     return True
@@ -142,17 +314,21 @@ def get_file_content(file_path: str, max_length: int = MAX_OBSERVATION_LENGTH) -
 
     Args:
         file_path: The path to the file
-        max_length: The maximum length of the content
+        max_length: The maximum number of bytes of the file to read
 
     Returns:
         The content of the file
     """
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            content = f.read(max_length)
-            if len(content) == max_length:
-                content += "... (truncated)"
-            return content
+        # Read one byte past the limit to tell whether the file was truncated
+        with open(file_path, "rb") as f:
+            data = f.read(max_length + 1)
+        if len(data) > max_length:
+            # The cap can fall inside a multibyte character; decoding incrementally
+            # drops that partial character instead of turning it into U+FFFD
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            return decoder.decode(data[:max_length]) + "... (truncated)"
+        return data.decode("utf-8", errors="replace")
     except Exception as e:
         return f"Error reading file: {e}"
 
@@ -185,6 +361,40 @@ def index_project(project_dir: str, client: MCPClient) -> None:
 
     print(f"Finished indexing project: {project_name}")
 
+def walk_directory(dir_path: str, dir_entity: str) -> Iterator[Tuple[str, List[os.DirEntry], List[os.DirEntry]]]:
+    """Walk a directory tree top-down, pruning excluded directories.
+
+    This works like os.walk(topdown=True), but yields the os.DirEntry objects
+    from scandir so their cached file type information can be reused. Removing
+    entries from the yielded subdirectory list prunes them from the walk.
+
+    Args:
+        dir_path: The path to the directory
+        dir_entity: The name of the entity for the directory
+
+    Yields:
+        Tuples of (directory entity name, subdirectory entries, file entries)
+    """
+    pending = [(dir_path, dir_entity)]
+    while pending:
+        path, entity = pending.pop()
+
+        subdirs = []
+        files = []
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in EXCLUDED_DIRS:
+                        subdirs.append(entry)
+                elif entry.is_file(follow_symlinks=False):
+                    files.append(entry)
+
+        yield entity, subdirs, files
+
+        # Push in reverse so subdirectories are visited in scan order
+        for entry in reversed(subdirs):
+            pending.append((entry.path, f"{entity}/{entry.name}"))
+
 def index_directory(dir_path: str, parent_entity: str, client: MCPClient) -> None:
     """Index a directory and its contents.
 
@@ -198,85 +408,90 @@ def index_directory(dir_path: str, parent_entity: str, client: MCPClient) -> Non
     if dir_name in EXCLUDED_DIRS:
         return
 
-    # Create entities for files and directories
-    file_entities = []
-    dir_entities = []
-    relations = []
-
-    # Process directories first
-    for item in os.listdir(dir_path):
-        item_path = os.path.join(dir_path, item)
+    entity_futures = []
+    relation_batches = []
 
-        if os.path.isdir(item_path):
-            # Skip excluded directories
-            if item in EXCLUDED_DIRS:
-                continue
+    # Entities and relations are gathered across directories, so a tree of
+    # small directories is sent in a few large calls instead of one per directory
+    entities = []
+    relations = []
 
+    for dir_entity, subdirs, files in walk_directory(dir_path, parent_entity):
+        for entry in subdirs:
             # Create an entity for the directory
-            dir_entity_name = f"{parent_entity}/{item}"
-            dir_entities.append({
+            dir_entity_name = f"{dir_entity}/{entry.name}"
+            entities.append({
                 "name": dir_entity_name,
                 "entityType": "Directory",
-                "observations": [f"Directory in {parent_entity}: {item}"]
+                "observations": [f"Directory in {dir_entity}: {entry.name}"]
             })
 
             # Create a relation from parent to directory
             relations.append({
-                "from": parent_entity,
+                "from": dir_entity,
                 "to": dir_entity_name,
                 "relationType": "CONTAINS"
             })
 
-    # Process files
-    for item in os.listdir(dir_path):
-        item_path = os.path.join(dir_path, item)
+        for entry in files:
+            if not should_include_file(entry):
+                continue
 
-        if os.path.isfile(item_path) and should_include_file(item_path):
             # Create an entity for the file
-            file_entity_name = f"{parent_entity}/{item}"
-            file_content = get_file_content(item_path)
+            file_entity_name = f"{dir_entity}/{entry.name}"
+            file_content = get_file_content(entry.path)
 
-            file_entities.append({
+            entities.append({
                 "name": file_entity_name,
                 "entityType": "File",
                 "observations": [
-                    f"File in {parent_entity}: {item}",
+                    f"File in {dir_entity}: {entry.name}",
                     file_content
                 ]
             })
 
             # Create a relation from parent to file
             relations.append({
-                "from": parent_entity,
+                "from": dir_entity,
                 "to": file_entity_name,
                 "relationType": "CONTAINS"
             })
 
-    # Create directory entities
-    if dir_entities:
-        client.call_tool("create_entities", {"entities": dir_entities})
+        # Create the entities without waiting for the server, so the walk
+        # carries on while it works
+        if len(entities) >= MIN_BATCH_SIZE:
+            entity_futures.append(client.submit("create_entities", {"entities": entities}))
+            entities = []
 
-    # Create file entities
-    if file_entities:
-        client.call_tool("create_entities", {"entities": file_entities})
+        if len(relations) >= MIN_BATCH_SIZE:
+            relation_batches.append(relations)
+            relations = []
 
-    # Create relations
+    if entities:
+        entity_futures.append(client.submit("create_entities", {"entities": entities}))
     if relations:
-        client.call_tool("create_relations", {"relations": relations})
+        relation_batches.append(relations)
 
-    # Recursively index subdirectories
-    for item in os.listdir(dir_path):
-        item_path = os.path.join(dir_path, item)
+    # Relations can only be created once the entities at both ends exist
+    for future in entity_futures:
+        client.wait(future)
 
-        if os.path.isdir(item_path) and item not in EXCLUDED_DIRS:
-            dir_entity_name = f"{parent_entity}/{item}"
-            index_directory(item_path, dir_entity_name, client)
+    client.call_tools_pipelined([
+        ("create_relations", {"relations": relations}) for relations in relation_batches
+    ])
 
 def main():
     """Main function."""
-    parser = argparse.ArgumentParser(description="Build a knowledge graph of the projects folder")
+    # Only needed by the command line, not by scripts importing this module
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Build a knowledge graph of the projects folder",
+        epilog=f"Set {CONTAINER_ID_ENV_VAR} to use a specific memory container instead of looking it up."
+    )
     parser.add_argument("--project", help="Specific project to index (default: all projects)")
     parser.add_argument("--reset", action="store_true", help="Reset the knowledge graph before indexing")
+    parser.add_argument("--verbose", action="store_true", help="Show the MCP server's stderr output")
     args = parser.parse_args()
 
     try:
@@ -285,42 +500,55 @@ def main():
         print(f"Found memory container: {container_id}")
 
         # Create an MCP client
-        client = MCPClient(container_id)
-
-        # Reset the knowledge graph if requested
-        if args.reset:
-            print("Resetting knowledge graph...")
-            graph = client.call_tool("read_graph", {})
-
-            # Delete all entities
-            if "entities" in graph and graph["entities"]:
-                entity_names = [entity["name"] for entity in graph["entities"]]
-                client.call_tool("delete_entities", {"entityNames": entity_names})
-
-            print("Knowledge graph reset complete")
-
-        # Index projects
-        if args.project:
-            # Index a specific project
-            project_path = os.path.join(PROJECTS_DIR, args.project)
-            if not os.path.isdir(project_path):
-                print(f"Project not found: {args.project}")
-                return 1
-
-            index_project(project_path, client)
-        else:
-            # Index all projects
-            for item in os.listdir(PROJECTS_DIR):
-                item_path = os.path.join(PROJECTS_DIR, item)
-                if os.path.isdir(item_path) and not item.startswith("."):
-                    index_project(item_path, client)
-
-        print("Indexing complete")
-        return 0
+        with MCPClient(container_id, args.verbose) as client:
+            # Reset the knowledge graph if requested
+            if args.reset:
+                print("Resetting knowledge graph...")
+                graph = client.call_tool("read_graph", {})
+
+                # Delete all entities
+                if "entities" in graph and graph["entities"]:
+                    entity_names = [entity["name"] for entity in graph["entities"]]
+                    client.call_tool("delete_entities", {"entityNames": entity_names})
+
+                print("Knowledge graph reset complete")
+
+            # Index projects
+            if args.project:
+                # Index a specific project
+                project_path = os.path.join(PROJECTS_DIR, args.project)
+                if not os.path.isdir(project_path):
+                    print(f"Project not found: {args.project}")
+                    return 1
+
+                index_project(project_path, client)
+            else:
+                # Index all projects
+                with os.scandir(PROJECTS_DIR) as it:
+                    project_entries = list(it)
+
+                project_paths = [
+                    entry.path for entry in project_entries
+                    if entry.is_dir(follow_symlinks=False) and not entry.name.startswith(".")
+                ]
+
+                # Projects are independent, so index them concurrently over the shared client
+                if project_paths:
+                    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(project_paths))) as executor:
+                        futures = [executor.submit(index_project, path, client) for path in project_paths]
+                        for future in as_completed(futures):
+                            future.result()
+
+            print("Indexing complete")
+            return 0
 
     except Exception as e:
         print(f"Error: {e}")
         return 1
 
+    finally:
+        # Even a failed run may have changed part of the graph
+        clear_query_cache()
+
 if __name__ == "__main__":
     sys.exit(main())
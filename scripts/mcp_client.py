@@ -12,92 +12,58 @@ import os
 import argparse
 from typing import Dict, Any, List, Optional
 
+from mcp_transport import MCPTransport
+
 class MCPClient:
     """Client for interacting with MCP servers."""
 
-    def __init__(self, container_id: str):
+    def __init__(self, container_id: str, verbose: bool = False):
         """Initialize the MCP client.
 
         Args:
             container_id: The ID or name of the MCP container
+            verbose: Whether to show the MCP server's stderr output
         """
         self.container_id = container_id
-        self.request_id = 0
+        self.transport = MCPTransport(container_id, verbose)
         self.initialize()
 
+    def __enter__(self) -> "MCPClient":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def close(self):
+        """Close the connection to the MCP server and wait for it to exit."""
+        self.transport.close()
+
     def initialize(self):
         """Initialize the connection to the MCP server."""
         # Send handshake request
-        request = {
-            "jsonrpc": "2.0",
-            "id": self.request_id,
-            "method": "handshake",
-            "params": {
-                "version": "2024-11-05",
-                "capabilities": {
-                    "transports": ["stdio"]
-                }
+        response = self._send_request("handshake", {
+            "version": "2024-11-05",
+            "capabilities": {
+                "transports": ["stdio"]
             }
-        }
-        self.request_id += 1
-
-        response = self._send_request(request)
+        })
         print("Handshake response:", json.dumps(response, indent=2))
 
         # Send server info request
-        request = {
-            "jsonrpc": "2.0",
-            "id": self.request_id,
-            "method": "server_info_request",
-            "params": {}
-        }
-        self.request_id += 1
-
-        response = self._send_request(request)
+        response = self._send_request("server_info_request", {})
         print("Server info response:", json.dumps(response, indent=2))
 
-    def _send_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
+    def _send_request(self, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
         """Send a request to the MCP server.
 
         Args:
-            request: The request to send
+            method: The JSON-RPC method to call
+            params: The parameters to pass to the method
 
         Returns:
             The response from the server
         """
-        # Convert request to JSON
-        request_json = json.dumps(request)
-
-        # Call the tool using docker exec
-        cmd = [
-            "docker", "exec", "-i", self.container_id,
-            "sh", "-c", f"echo '{request_json}' | node dist/index.js"
-        ]
-
-        try:
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                check=True
-            )
-
-            # Parse the response
-            response_lines = result.stdout.strip().split("\n")
-            for line in response_lines:
-                if line.startswith("{"):
-                    try:
-                        response = json.loads(line)
-                        return response
-                    except json.JSONDecodeError:
-                        continue
-
-            raise Exception(f"Failed to parse response: {result.stdout}")
-        except subprocess.CalledProcessError as e:
-            print(f"Error sending request: {e}")
-            print(f"Stdout: {e.stdout}")
-            print(f"Stderr: {e.stderr}")
-            raise
+        return self.transport.send(method, params).result()
 
     def call_tool(self, tool_name: str, params: Dict[str, Any]) -> Dict[str, Any]:
         """Call a tool on the MCP server.
@@ -109,18 +75,10 @@ class MCPClient:
         Returns:
             The result of the tool call
         """
-        request = {
-            "jsonrpc": "2.0",
-            "id": self.request_id,
-            "method": "tool_call_request",
-            "params": {
-                "tool": tool_name,
-                "parameters": params
-            }
-        }
-        self.request_id += 1
-
-        response = self._send_request(request)
+        response = self._send_request("tool_call_request", {
+            "tool": tool_name,
+            "parameters": params
+        })
 
         if "error" in response:
             raise Exception(f"Error calling tool {tool_name}: {response['error']}")
@@ -147,6 +105,7 @@ def main():
     parser = argparse.ArgumentParser(description="MCP Client")
     parser.add_argument("--tool", help="Tool to call")
     parser.add_argument("--params", help="Parameters to pass to the tool (JSON)")
+    parser.add_argument("--verbose", action="store_true", help="Show the MCP server's stderr output")
     args = parser.parse_args()
 
     try:
@@ -155,16 +114,15 @@ def main():
         print(f"Found memory container: {container_id}")
 
         # Create an MCP client
-        client = MCPClient(container_id)
-
-        # Call a tool if specified
-        if args.tool:
-            params = {}
-            if args.params:
-                params = json.loads(args.params)
-
-            result = client.call_tool(args.tool, params)
-            print(f"Tool result: {json.dumps(result, indent=2)}")
+        with MCPClient(container_id, args.verbose) as client:
+            # Call a tool if specified
+            if args.tool:
+                params = {}
+                if args.params:
+                    params = json.loads(args.params)
+
+                result = client.call_tool(args.tool, params)
+                print(f"Tool result: {json.dumps(result, indent=2)}")
 
         return 0
 
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+MCP Transport
+
+A JSON-RPC transport to an MCP server running in a Docker container, shared by
+the MCP client scripts.
+"""
+
+import json
+import subprocess
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+# orjson is much faster on large payloads; fall back to json without it
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def dumps_message(message: Dict[str, Any]) -> bytes:
+    """Serialize a JSON-RPC message, using orjson when it is available.
+
+    Args:
+        message: The message to serialize
+
+    Returns:
+        The message as UTF-8 encoded JSON
+    """
+    if orjson is not None:
+        return orjson.dumps(message)
+    return json.dumps(message).encode("utf-8")
+
+def loads_message(line: bytes) -> Dict[str, Any]:
+    """Parse a JSON-RPC message, using orjson when it is available.
+
+    Args:
+        line: The UTF-8 encoded JSON of the message
+
+    Returns:
+        The parsed message
+    """
+    if orjson is not None:
+        return orjson.loads(line)
+    return json.loads(line)
+
+# Seconds to wait for an exiting server's exit code before reporting it as still running
+EXIT_WAIT_TIMEOUT = 1
+STDERR_TAIL_LINES = 5  # Lines of the server's stderr kept for error messages
+
+class MCPTransport:
+    """Persistent JSON-RPC connection to an MCP server.
+
+    A single ``node dist/index.js`` process is started inside the container and
+    kept alive for the lifetime of the transport. Requests and responses are
+    exchanged as newline-delimited JSON-RPC messages over its stdin/stdout.
+
+    Every request returns a Future that resolves to the server's response.
+    Responses are read by a background thread as soon as they arrive and
+    matched to their Future by ID, so any number of threads can have any
+    number of requests in flight without either pipe filling up.
+    """
+
+    def __init__(self, container_id: str, verbose: bool = False):
+        """Start the MCP server and the thread that reads its responses.
+
+        Args:
+            container_id: The ID or name of the MCP container
+            verbose: Whether to show the MCP server's stderr output; otherwise
+                only its last lines are kept, to explain why it exited
+        """
+        self.container_id = container_id
+        self.request_id = 0
+        self.futures = {}  # Request ID -> (method, Future) for responses not yet read
+        self.write_lock = threading.Lock()  # Serializes writes to stdin
+        self.futures_lock = threading.Lock()  # Guards futures; never held while blocked on a pipe
+        self.server_exited = False
+        self.read_error = None  # Why responses stopped being read, if not because the server exited
+        self.stderr_tail = deque(maxlen=STDERR_TAIL_LINES)
+        self.process = subprocess.Popen(
+            ["docker", "exec", "-i", self.container_id, "node", "dist/index.js"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=None if verbose else subprocess.PIPE
+        )
+        # Started before the response reader, which joins it once the server exits
+        self.stderr_reader = None
+        if not verbose:
+            self.stderr_reader = threading.Thread(target=self._read_stderr, daemon=True)
+            self.stderr_reader.start()
+        self.reader = threading.Thread(target=self._read_responses, daemon=True)
+        self.reader.start()
+
+    def __enter__(self) -> "MCPTransport":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the connection to the MCP server and wait for it to exit."""
+        if self.process.poll() is None:
+            try:
+                self.process.stdin.close()
+            except OSError:
+                pass  # The server exited with requests still unflushed
+            self.process.wait()
+        self.reader.join()
+        if self.stderr_reader is not None:
+            self.stderr_reader.join()
+
+    def send_many(self, calls: List[Tuple[str, Optional[Dict[str, Any]]]]) -> List[Future]:
+        """Send several requests to the MCP server in a single write.
+
+        Args:
+            calls: (method, parameters) pairs for the requests to send; requests
+                with parameters of None are sent without a params member
+
+        Returns:
+            Futures resolving to the responses, in the same order as the calls
+        """
+        if not calls:
+            return []
+
+        with self.write_lock:
+            futures = []
+            requests = []
+            with self.futures_lock:
+                read_error = self.read_error
+                server_exited = self.server_exited
+                for method, params in [] if server_exited else calls:
+                    request = {
+                        "jsonrpc": "2.0",
+                        "id": self.request_id,
+                        "method": method
+                    }
+                    if params is not None:
+                        request["params"] = params
+                    future = Future()
+                    self.futures[self.request_id] = (method, future)
+                    futures.append(future)
+                    self.request_id += 1
+                    requests.append(request)
+
+            if read_error is not None:
+                raise Exception(f"Failed to read MCP server responses: {read_error}")
+            if server_exited:
+                raise Exception(f"MCP server has exited ({self._exit_status()})")
+
+            # Written without the futures lock, so the reader can keep draining
+            # responses while this blocks on a full pipe
+            try:
+                self.process.stdin.write(b"".join(dumps_message(request) + b"\n" for request in requests))
+                self.process.stdin.flush()
+            except OSError:
+                # The server is gone (for example docker exec could not start
+                # it); the reader fails these requests once it sees EOF
+                raise Exception(f"MCP server has exited ({self._exit_status()})") from None
+
+        return futures
+
+    def send(self, method: str, params: Optional[Dict[str, Any]] = None) -> Future:
+        """Send a request to the MCP server.
+
+        Args:
+            method: The JSON-RPC method to call
+            params: The parameters to pass to the method, if any
+
+        Returns:
+            A Future resolving to the response
+        """
+        return self.send_many([(method, params)])[0]
+
+    def _read_responses(self) -> None:
+        """Read responses from the server until it exits, on the reader thread."""
+        try:
+            # The server's stdout carries nothing but protocol messages, one per line
+            for line in self.process.stdout:
+                response = loads_message(line)
+                if "id" not in response:
+                    continue
+
+                with self.futures_lock:
+                    _, future = self.futures.pop(response["id"], (None, None))
+                if future is not None:
+                    future.set_result(response)
+        except Exception as e:
+            self.read_error = e
+            # Responses can no longer be matched to requests, so fail everything
+            # still waiting before draining; callers then close the transport,
+            # which lets the server reach EOF and exit
+            self._fail_pending(lambda method: Exception(f"Failed to read response to {method}: {e}"))
+            # Keep draining stdout so the server never blocks writing to it
+            for _ in self.process.stdout:
+                pass
+        else:
+            status = self._exit_status()
+            self._fail_pending(lambda method: Exception(f"MCP server exited while calling {method} ({status})"))
+
+    def _read_stderr(self) -> None:
+        """Keep the last lines of the server's stderr, on the stderr thread."""
+        for line in self.process.stderr:
+            line = line.decode("utf-8", errors="replace").strip()
+            if line:
+                self.stderr_tail.append(line)
+
+    def _exit_status(self) -> str:
+        """Describe how the server exited, for error messages.
+
+        Includes the end of the server's stderr, which is where docker exec
+        explains a failure such as a missing container.
+        """
+        try:
+            status = f"exit code {self.process.wait(timeout=EXIT_WAIT_TIMEOUT)}"
+        except subprocess.TimeoutExpired:
+            return "still running"
+
+        if self.stderr_reader is not None:
+            # The process has exited, so the rest of its stderr is already in the pipe
+            self.stderr_reader.join(EXIT_WAIT_TIMEOUT)
+            if self.stderr_tail:
+                status += ": " + "; ".join(self.stderr_tail)
+        return status
+
+    def _fail_pending(self, make_error: Callable[[str], Exception]) -> None:
+        """Stop accepting requests and fail every request still awaiting a response.
+
+        Args:
+            make_error: Builds the exception to fail a request with from its method
+        """
+        with self.futures_lock:
+            self.server_exited = True
+            pending = list(self.futures.values())
+            self.futures.clear()
+
+        for method, future in pending:
+            future.set_exception(make_error(method))
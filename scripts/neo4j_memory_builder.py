@@ -6,35 +6,61 @@ This script builds a knowledge graph of the projects directory using Neo4j memor
 It creates entities for projects, directories, and important files, and establishes relationships between them.
 """
 
+import codecs
 import os
 import json
 import sys
 import time
 from typing import List, Dict, Any, Optional
 
+# orjson is much faster on large files; fall back to json without it
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Configuration
 PROJECTS_DIR = '/home/thein/projects'
-IGNORE_DIRS = [
+IGNORE_DIRS = frozenset([
     'node_modules', '.git', '.vscode', 'out', 'dist', 'build', 'coverage', '.cache'
-]
+])
 IMPORTANT_FILES = [
     'package.json', 'README.md', '.augment-guidelines', 'tsconfig.json',
     'docker-compose.yml', 'Dockerfile', 'devcontainer.json'
 ]
 MAX_BATCH_SIZE = 10  # Maximum number of entities/relations to create in a single batch
+VERBOSE = '--verbose' in sys.argv  # Print the full content of every batch
 
-def read_file_safe(file_path: str, max_size: int = 10000) -> str:
+def read_file_safe(entry: os.DirEntry, max_size: int = 10000) -> str:
     """Read file content safely with size limit."""
     try:
-        file_size = os.path.getsize(file_path)
-        if file_size > max_size:
-            return f"File too large ({file_size} bytes)"
-        
-        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
-            return f.read()
+        # Stop reading at the cap; one byte past it means the file is truncated
+        with open(entry.path, 'rb') as f:
+            data = f.read(max_size + 1)
+        if len(data) > max_size:
+            # Not passing final=True makes the decoder hold back a character cut by the cap
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+            return decoder.decode(data[:max_size]) + "... (truncated)"
+        return data.decode('utf-8', errors='replace')
     except Exception as e:
         return f"Error reading file: {str(e)}"
 
+def read_package_json(entry: os.DirEntry) -> Dict[str, Any]:
+    """Parse package.json straight from its bytes, without a size limit."""
+    with open(entry.path, 'rb') as f:
+        data = f.read()
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def print_batch(batch: List[Dict[str, Any]]) -> None:
+    """Print a batch as indented JSON in a single write."""
+    if orjson is not None:
+        output = orjson.dumps(batch, option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE).decode()
+    else:
+        output = json.dumps(batch, indent=2) + "\n"
+    sys.stdout.write(output)
+
 def create_entities_batch(entities: List[Dict[str, Any]]) -> None:
     """Create entities in batches."""
     if not entities:
@@ -45,7 +71,8 @@ def create_entities_batch(entities: List[Dict[str, Any]]) -> None:
         try:
             # Call the memory function to create entities
             print(f"Creating {len(batch)} entities (batch {i // MAX_BATCH_SIZE + 1})")
-            print(json.dumps(batch, indent=2))
+            if VERBOSE:
+                print_batch(batch)
             # In a real implementation, this would be:
             # create_entities_memory({"entities": batch})
         except Exception as e:
@@ -61,17 +88,30 @@ def create_relations_batch(relations: List[Dict[str, Any]]) -> None:
         try:
             # Call the memory function to create relations
             print(f"Creating {len(batch)} relations (batch {i // MAX_BATCH_SIZE + 1})")
-            print(json.dumps(batch, indent=2))
+            if VERBOSE:
+                print_batch(batch)
             # In a real implementation, this would be:
             # create_relations_memory({"relations": batch})
         except Exception as e:
             print(f"Error creating relations: {str(e)}")
 
+def scan_entries(dir_path: str) -> Dict[str, os.DirEntry]:
+    """List a directory's entries by name, treating an unreadable directory as empty."""
+    try:
+        with os.scandir(dir_path) as it:
+            return {entry.name: entry for entry in it}
+    except OSError as e:
+        print(f"Error reading directory {dir_path}: {str(e)}")
+        return {}
+
 def process_project(project_path: str) -> None:
     """Process a project and add it to the knowledge graph."""
     project_name = os.path.basename(project_path)
     print(f"Processing project: {project_name}")
     
+    # Scan the project directory once and look up candidate files by name
+    entries = scan_entries(project_path)
+    
     entities = []
     relations = []
     
@@ -83,10 +123,10 @@ def process_project(project_path: str) -> None:
     }
     
     # Add package.json info if available
-    package_json_path = os.path.join(project_path, 'package.json')
-    if os.path.exists(package_json_path):
+    package_json_entry = entries.get('package.json')
+    if package_json_entry and package_json_entry.is_file(follow_symlinks=False):
         try:
-            package_json = json.loads(read_file_safe(package_json_path))
+            package_json = read_package_json(package_json_entry)
             if 'name' in package_json:
                 project_entity["observations"].append(f"Name: {package_json['name']}")
             if 'description' in package_json:
@@ -97,60 +137,67 @@ def process_project(project_path: str) -> None:
             print(f"Error parsing package.json for {project_name}: {str(e)}")
     
     # Add README.md content if available
-    readme_path = os.path.join(project_path, 'README.md')
-    if os.path.exists(readme_path):
-        readme_content = read_file_safe(readme_path)
+    readme_entry = entries.get('README.md')
+    if readme_entry and readme_entry.is_file(follow_symlinks=False):
+        readme_content = read_file_safe(readme_entry)
         project_entity["observations"].append(f"README: {readme_content}")
     
     entities.append(project_entity)
     
     # Process important files
     for file_name in IMPORTANT_FILES:
-        file_path = os.path.join(project_path, file_name)
-        if os.path.exists(file_path) and os.path.isfile(file_path):
-            file_content = read_file_safe(file_path)
+        entry = entries.get(file_name)
+        if entry and entry.is_file(follow_symlinks=False):
+            file_path = entry.path
+            entity_name = f"{project_name}:{file_name}"
+            file_content = read_file_safe(entry)
             entities.append({
-                "name": f"{project_name}:{file_name}",
+                "name": entity_name,
                 "entityType": "File",
                 "observations": [f"Path: {file_path}", f"Content: {file_content}"]
             })
             
             relations.append({
                 "from": project_name,
-                "to": f"{project_name}:{file_name}",
+                "to": entity_name,
                 "relationType": "contains"
             })
     
     # Process .devcontainer directory if it exists
-    devcontainer_dir = os.path.join(project_path, '.devcontainer')
-    if os.path.exists(devcontainer_dir) and os.path.isdir(devcontainer_dir):
+    devcontainer_entry = entries.get('.devcontainer')
+    if devcontainer_entry and devcontainer_entry.is_dir(follow_symlinks=False):
+        devcontainer_entries = scan_entries(devcontainer_entry.path)
+        devcontainer_name = f"{project_name}:devcontainer"
+        
         entities.append({
-            "name": f"{project_name}:devcontainer",
+            "name": devcontainer_name,
             "entityType": "Component",
             "observations": ["DevContainer configuration for the project"]
         })
         
         relations.append({
             "from": project_name,
-            "to": f"{project_name}:devcontainer",
+            "to": devcontainer_name,
             "relationType": "has"
         })
         
         # Process important devcontainer files
         devcontainer_files = ['devcontainer.json', 'docker-compose.yml', 'Dockerfile']
         for file_name in devcontainer_files:
-            file_path = os.path.join(devcontainer_dir, file_name)
-            if os.path.exists(file_path) and os.path.isfile(file_path):
-                file_content = read_file_safe(file_path)
+            entry = devcontainer_entries.get(file_name)
+            if entry and entry.is_file(follow_symlinks=False):
+                file_path = entry.path
+                entity_name = f"{devcontainer_name}:{file_name}"
+                file_content = read_file_safe(entry)
                 entities.append({
-                    "name": f"{project_name}:devcontainer:{file_name}",
+                    "name": entity_name,
                     "entityType": "File",
                     "observations": [f"Path: {file_path}", f"Content: {file_content}"]
                 })
                 
                 relations.append({
-                    "from": f"{project_name}:devcontainer",
-                    "to": f"{project_name}:devcontainer:{file_name}",
+                    "from": devcontainer_name,
+                    "to": entity_name,
                     "relationType": "contains"
                 })
     
@@ -164,16 +211,17 @@ def build_knowledge_graph() -> None:
     
     try:
         # Get list of projects
-        projects = [
-            os.path.join(PROJECTS_DIR, item) for item in os.listdir(PROJECTS_DIR)
-            if os.path.isdir(os.path.join(PROJECTS_DIR, item)) and item not in IGNORE_DIRS
-        ]
+        with os.scandir(PROJECTS_DIR) as it:
+            projects = [
+                entry for entry in it
+                if entry.is_dir(follow_symlinks=False) and entry.name not in IGNORE_DIRS
+            ]
         
-        print(f"Found {len(projects)} projects: {', '.join(os.path.basename(p) for p in projects)}")
+        print(f"Found {len(projects)} projects: {', '.join(project.name for project in projects)}")
         
         # Process each project
         for project in projects:
-            process_project(project)
+            process_project(project.path)
         
         print("Knowledge graph built successfully!")
     except Exception as e:
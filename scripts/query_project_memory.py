@@ -9,13 +9,20 @@ It allows searching for entities, relations, and observations in the graph.
 import os
 import sys
 import json
-import subprocess
-import argparse
-from typing import List, Dict, Any, Optional, Tuple
+import re
+import time
+from collections import Counter
+from typing import Callable, List, Dict, Any, Optional, Tuple
 
 # Import the MCPClient from build_project_memory.py
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from build_project_memory import MCPClient, get_memory_container_id
+from build_project_memory import CONTAINER_ID_ENV_VAR, QUERY_CACHE_DIR, MCPClient, get_memory_container_id
+
+PREVIEW_OBSERVATIONS = 2  # Observations shown per entity without --verbose
+MAX_OBSERVATION_PREVIEW = 100  # Characters shown per observation
+
+# The project list and graph summary are cached on disk between runs.
+# build_project_memory.py clears the cache whenever it changes the graph.
+CACHE_TTL = 300  # Seconds before a cached result is fetched again
 
 def search_knowledge_graph(query: str, client: MCPClient) -> Dict[str, Any]:
     """Search the knowledge graph for entities matching the query.
@@ -29,115 +36,238 @@ def search_knowledge_graph(query: str, client: MCPClient) -> Dict[str, Any]:
     """
     return client.call_tool("search_nodes", {"query": query})
 
-def get_entity_details(entity_names: List[str], client: MCPClient) -> Dict[str, Any]:
-    """Get details for specific entities.
+def get_entity(entity_name: str, client: MCPClient) -> Optional[Dict[str, Any]]:
+    """Get details for a single entity.
     
     Args:
-        entity_names: The names of the entities to retrieve
+        entity_name: The name of the entity to retrieve
         client: The MCP client
         
     Returns:
-        The entity details
+        The entity, or None if it is not in the knowledge graph
+    """
+    results = client.call_tool("open_nodes", {"names": [entity_name]})
+    # Pick the entity out by name rather than trusting the result's order
+    for entity in results.get("entities", []):
+        if entity["name"] == entity_name:
+            return entity
+    return None
+
+def cache_path(key: str) -> str:
+    """Get the path of a cache file.
+    
+    Results are cached per memory container: the container named by the
+    MCP_MEMORY_CONTAINER_ID override when it is set, and the looked-up
+    container otherwise.
+    
+    Args:
+        key: The name of the cached result
+        
+    Returns:
+        The path of the cache file
+    """
+    container = re.sub(r"[^A-Za-z0-9_.-]", "_", os.environ.get(CONTAINER_ID_ENV_VAR) or "default")
+    return os.path.join(QUERY_CACHE_DIR, f"{key}-{container}.json")
+
+def cached_call(key: str, fn: Callable[[], Any], ttl: int = CACHE_TTL, use_cache: bool = True) -> Any:
+    """Return the result of fn, reusing the result cached on disk when fresh.
+    
+    The result is stored as {"ts": ..., "payload": ...} JSON, so it must be
+    JSON serializable. A missing, unreadable or stale cache file is ignored
+    and replaced with a fresh result. A cached result can be up to ttl
+    seconds behind changes made to the graph by anything other than
+    build_project_memory.py.
+    
+    Args:
+        key: The name of the cached result
+        fn: Computes the result when it is not cached
+        ttl: The number of seconds a cached result stays fresh
+        use_cache: Whether to read the cache; the fresh result is written either way
+        
+    Returns:
+        The cached or freshly computed result
+    """
+    path = cache_path(key)
+    
+    if use_cache:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            if time.time() - cached["ts"] < ttl:
+                return cached["payload"]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+    
+    payload = fn()
+    
+    try:
+        os.makedirs(QUERY_CACHE_DIR, exist_ok=True)
+        # Write to a temporary file first so a concurrent run never reads half a file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"ts": time.time(), "payload": payload}, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+    
+    return payload
+
+def read_graph() -> Dict[str, Any]:
+    """Read the whole knowledge graph over a new MCP session.
+    
+    Returns:
+        The entities and relations in the graph
+    """
+    with MCPClient(get_memory_container_id()) as client:
+        return client.call_tool("read_graph", {})
+
+def summarize_graph(graph: Dict[str, Any]) -> Dict[str, Any]:
+    """Summarize the knowledge graph for the graph summary and --list-projects.
+    
+    Args:
+        graph: The graph returned by read_graph
+        
+    Returns:
+        {"counts": number of entities of each type, "projects": project names}
+    """
+    entities = graph.get("entities", [])
+    return {
+        "counts": Counter(entity["entityType"] for entity in entities),
+        "projects": [entity["name"] for entity in entities if entity["entityType"] == "Project"]
+    }
+
+def fetch_summary() -> Dict[str, Any]:
+    """Read and summarize the knowledge graph.
+    
+    Returns:
+        The summary built by summarize_graph()
+    """
+    return summarize_graph(read_graph())
+
+def format_entity(entity: Dict[str, Any], verbose: bool = False) -> str:
+    """Format an entity in a readable format.
+    
+    Args:
+        entity: The entity to format
+        verbose: Whether to include all observations
+        
+    Returns:
+        The formatted entity, ending with a blank line
     """
-    return client.call_tool("open_nodes", {"names": entity_names})
+    lines = [f"Entity: {entity['name']}", f"Type: {entity['entityType']}"]
+    
+    observations = entity.get("observations")
+    if observations:
+        lines.append("Observations:")
+        shown = observations if verbose else observations[:PREVIEW_OBSERVATIONS]
+        lines.extend(
+            f"  - {obs[:MAX_OBSERVATION_PREVIEW]}{'...' if len(obs) > MAX_OBSERVATION_PREVIEW else ''}"
+            for obs in shown
+        )
+        if len(shown) < len(observations):
+            lines.append(f"  - ... ({len(observations) - len(shown)} more observations)")
+    
+    relations = entity.get("relations")
+    if relations:
+        lines.append("Relations:")
+        lines.extend(f"  - {rel['from']} {rel['relationType']} {rel['to']}" for rel in relations)
+    
+    return "\n".join(lines) + "\n\n"
 
-def print_entity(entity: Dict[str, Any], verbose: bool = False) -> None:
-    """Print an entity in a readable format.
+def print_entities(entities: List[Dict[str, Any]], verbose: bool = False) -> None:
+    """Print entities in a readable format.
+    
+    All entities are formatted first and written to stdout in a single write,
+    rather than a write per line or per entity.
     
     Args:
-        entity: The entity to print
+        entities: The entities to print
         verbose: Whether to print all observations
     """
-    print(f"Entity: {entity['name']}")
-    print(f"Type: {entity['entityType']}")
-    
-    if "observations" in entity and entity["observations"]:
-        print("Observations:")
-        for i, obs in enumerate(entity["observations"]):
-            if verbose or i < 2:
-                print(f"  - {obs[:100]}{'...' if len(obs) > 100 else ''}")
-            elif i == 2:
-                print(f"  - ... ({len(entity['observations']) - 2} more observations)")
-                break
-    
-    if "relations" in entity and entity["relations"]:
-        print("Relations:")
-        for rel in entity["relations"]:
-            print(f"  - {rel['from']} {rel['relationType']} {rel['to']}")
-    
-    print()
-
-def main():
+    payload = "".join(format_entity(entity, verbose) for entity in entities)
+    # Flush whatever print() has buffered so the output stays in order
+    sys.stdout.flush()
+    sys.stdout.buffer.write(payload.encode(sys.stdout.encoding or "utf-8", "replace"))
+    sys.stdout.buffer.flush()
+
+def main() -> int:
     """Main function."""
-    parser = argparse.ArgumentParser(description="Query the project knowledge graph")
+    # Only needed by the command line, not by scripts importing this module
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        description="Query the project knowledge graph",
+        epilog=f"Set {CONTAINER_ID_ENV_VAR} to use a specific memory container instead of looking it up."
+    )
     parser.add_argument("--search", help="Search for entities matching the query")
     parser.add_argument("--entity", help="Get details for a specific entity")
     parser.add_argument("--verbose", action="store_true", help="Show all observations")
     parser.add_argument("--list-projects", action="store_true", help="List all projects in the knowledge graph")
+    parser.add_argument("--details", action="store_true", help="Show every entity after the graph summary")
+    parser.add_argument("--no-cache", action="store_true",
+                        help=f"Fetch the project list or graph summary again instead of using one cached "
+                             f"in the last {CACHE_TTL}s")
     args = parser.parse_args()
     
     try:
-        # Get the memory container ID
-        container_id = get_memory_container_id()
-        
-        # Create an MCP client
-        client = MCPClient(container_id)
-        
         if args.list_projects:
-            # List all projects
-            results = client.call_tool("search_nodes", {"query": "entityType:Project"})
+            # List all projects, from the same cached summary as the graph summary
+            summary = cached_call("summary", fetch_summary, use_cache=not args.no_cache)
             
-            if "entities" in results and results["entities"]:
+            if summary["projects"]:
                 print("Projects in the knowledge graph:")
-                for entity in results["entities"]:
-                    print(f"- {entity['name']}")
+                for name in summary["projects"]:
+                    print(f"- {name}")
             else:
                 print("No projects found in the knowledge graph")
         
-        elif args.search:
-            # Search for entities
-            results = search_knowledge_graph(args.search, client)
+        elif args.search or args.entity:
+            # Get the memory container ID
+            container_id = get_memory_container_id()
             
-            if "entities" in results and results["entities"]:
-                print(f"Found {len(results['entities'])} entities matching '{args.search}':")
-                for entity in results["entities"]:
-                    print_entity(entity, args.verbose)
-            else:
-                print(f"No entities found matching '{args.search}'")
-        
-        elif args.entity:
-            # Get details for a specific entity
-            results = get_entity_details([args.entity], client)
-            
-            if "entities" in results and results["entities"]:
-                print(f"Details for entity '{args.entity}':")
-                print_entity(results["entities"][0], args.verbose)
-            else:
-                print(f"Entity not found: {args.entity}")
+            # Create an MCP client
+            with MCPClient(container_id) as client:
+                if args.search:
+                    # Search for entities
+                    results = search_knowledge_graph(args.search, client)
+                    
+                    if "entities" in results and results["entities"]:
+                        print(f"Found {len(results['entities'])} entities matching '{args.search}':")
+                        print_entities(results["entities"], args.verbose)
+                    else:
+                        print(f"No entities found matching '{args.search}'")
+                
+                else:
+                    # Get details for a specific entity
+                    entity = get_entity(args.entity, client)
+                    
+                    if entity is not None:
+                        print(f"Details for entity '{args.entity}':")
+                        print_entities([entity], args.verbose)
+                    else:
+                        print(f"Entity not found: {args.entity}")
         
         else:
-            # Show the entire knowledge graph
-            graph = client.call_tool("read_graph", {})
+            # Summarize the knowledge graph; the entities themselves are only
+            # needed, and never cached, when they are going to be printed
+            if args.details:
+                graph = read_graph()
+                summary = summarize_graph(graph)
+            else:
+                summary = cached_call("summary", fetch_summary, use_cache=not args.no_cache)
             
-            if "entities" in graph and graph["entities"]:
-                print(f"Knowledge graph contains {len(graph['entities'])} entities:")
-                
-                # Group entities by type
-                entities_by_type = {}
-                for entity in graph["entities"]:
-                    entity_type = entity["entityType"]
-                    if entity_type not in entities_by_type:
-                        entities_by_type[entity_type] = []
-                    entities_by_type[entity_type].append(entity)
+            # A cached summary comes back as a plain dict
+            counts = Counter(summary["counts"])
+            if counts:
+                print(f"Knowledge graph contains {sum(counts.values())} entities:")
                 
-                # Print summary by type
-                for entity_type, entities in entities_by_type.items():
-                    print(f"- {entity_type}: {len(entities)} entities")
+                # Print summary by type, largest first
+                for entity_type, count in counts.most_common():
+                    print(f"- {entity_type}: {count} entities")
                 
-                # Ask if user wants to see details
-                if input("\nShow entity details? (y/n): ").lower() == "y":
-                    for entity in graph["entities"]:
-                        print_entity(entity, args.verbose)
+                if args.details:
+                    print()
+                    print_entities(graph["entities"], args.verbose)
             else:
                 print("Knowledge graph is empty")
         
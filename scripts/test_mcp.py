@@ -6,56 +6,35 @@ This script tests the MCP server by sending a simple request to list the availab
 """
 
 import json
-import subprocess
 import sys
 
+from build_project_memory import get_memory_container_id
+from mcp_transport import MCPTransport
+
 def main():
     """Main function."""
-    # Get the container ID
-    cmd = ["docker", "ps", "--filter", "ancestor=mcp/memory", "--format", "{{.ID}}"]
-    result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-    container_id = result.stdout.strip()
-    
-    if not container_id:
-        print("Memory container not found")
+    # Get the container ID, the same way the other memory scripts do
+    try:
+        container_id = get_memory_container_id()
+    except Exception as e:
+        print(f"Memory container not found: {e}")
         return 1
     
     print(f"Found memory container: {container_id}")
     
-    # Create a request to list tools
-    request = {
-        "jsonrpc": "2.0",
-        "id": 1,
-        "method": "listTools"
-    }
-    
-    # Convert request to JSON
-    request_json = json.dumps(request)
-    
-    # Call the tool using docker exec
-    cmd = [
-        "docker", "exec", "-i", container_id,
-        "sh", "-c", f"echo '{request_json}' | node dist/index.js"
-    ]
-    
     try:
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            check=True
-        )
+        # Send a request to list tools over a persistent connection
+        with MCPTransport(container_id, verbose=True) as transport:
+            response = transport.send("listTools").result()
         
         # Print the response
         print("Response:")
-        print(result.stdout)
+        print(json.dumps(response, indent=2))
         
         return 0
     
-    except subprocess.CalledProcessError as e:
+    except Exception as e:
         print(f"Error: {e}")
-        print(f"Stdout: {e.stdout}")
-        print(f"Stderr: {e.stderr}")
         return 1
 
 if __name__ == "__main__":